@@ -1,17 +1,39 @@
+from __future__ import annotations
+
 import os
-import base64
-import json
+import re
 from io import BytesIO
+from typing import TYPE_CHECKING, Callable
 
 import streamlit as st
-from streamlit.components.v1 import html as st_html
 
-import anthropic
-from PIL import Image
+# anthropic and PIL are imported lazily inside the helpers that use them so
+# the UI can render before these heavy dependencies are loaded.
+if TYPE_CHECKING:
+    import anthropic
+    from PIL import Image
+
+# pybase64 uses SIMD-accelerated encoding; fall back to the stdlib if missing.
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 
 # ---------- Anthropic client helper ----------
 
+@st.cache_resource
+def _build_claude_client(api_key: str) -> anthropic.Anthropic:
+    import anthropic
+
+    # Cached per API key so Streamlit reruns reuse the same client (and only
+    # import anthropic once) along with its pooled HTTP/2 connection.
+    return anthropic.Anthropic(
+        api_key=api_key,
+        http_client=anthropic.DefaultHttpxClient(http2=True),
+    )
+
+
 def get_claude_client() -> anthropic.Anthropic:
     api_key = None
 
@@ -32,19 +54,90 @@ def get_claude_client() -> anthropic.Anthropic:
             "Streamlit secrets or as an environment variable."
         )
 
-    return anthropic.Anthropic(api_key=api_key)
+    return _build_claude_client(api_key)
 
 
 # ---------- Image helper: normalize to PNG & downscale ----------
 
-def to_png_bytes(raw_bytes: bytes, target_max_bytes: int = 4_000_000) -> bytes:
+VISION_MAX_EDGE = 1568  # Claude resizes anything larger down to this anyway
+# The API's 5 MB image limit applies to the base64 data, which is 4/3 the
+# size of the raw bytes.
+MAX_IMAGE_BYTES = 5 * 1024 * 1024 * 3 // 4
+
+
+# Pillow format name -> media type Claude accepts as-is
+CLAUDE_MEDIA_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "MPO": "image/jpeg",  # multi-picture JPEG written by many phone cameras
+    "GIF": "image/gif",
+    "WEBP": "image/webp",
+}
+
+
+def sniff_image(raw_bytes: bytes) -> tuple[str | None, bool]:
+    """
+    Return (media_type, fits) for the actual image bytes: the Claude media
+    type of the sniffed format (None if unsupported) and whether it already
+    fits within VISION_MAX_EDGE.
+
+    The browser-reported type only reflects the file extension, so it can't
+    be trusted as the media type sent to the API.
+    """
+    from PIL import Image
+
+    # Image.open only parses the header here, so this is cheap.
+    img = Image.open(BytesIO(raw_bytes))
+    return CLAUDE_MEDIA_TYPES.get(img.format), max(img.size) <= VISION_MAX_EDGE
+
+
+def shrink_to_vision_max(img: Image.Image) -> Image.Image:
+    from PIL import Image
+
+    w, h = img.size
+    scale = min(1.0, VISION_MAX_EDGE / max(w, h))
+    if scale < 1:
+        # Clamp so extreme aspect ratios don't round a side down to 0 px
+        new_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        img = img.resize(new_size, Image.LANCZOS)
+    return img
+
+
+def to_compact_bytes(raw_bytes: bytes) -> tuple[str, memoryview]:
+    """
+    Downscale a JPEG/WebP/GIF to VISION_MAX_EDGE and re-encode it as JPEG, or
+    as WebP when it has an alpha channel. Both stay far smaller than a PNG of
+    the same photo.
+
+    Returns (media_type, image bytes).
+    """
+    from PIL import Image
+
+    img = Image.open(BytesIO(raw_bytes))
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (
+        img.mode == "P" and "transparency" in img.info
+    )
+    buf = BytesIO()
+    if has_alpha:
+        shrink_to_vision_max(img.convert("RGBA")).save(buf, format="WEBP", quality=90)
+        return "image/webp", buf.getbuffer()
+    shrink_to_vision_max(img.convert("RGB")).save(buf, format="JPEG", quality=90)
+    return "image/jpeg", buf.getbuffer()
+
+
+def to_png_bytes(raw_bytes: bytes, target_max_bytes: int = MAX_IMAGE_BYTES) -> memoryview:
     """
     Open the uploaded image and re-encode it as PNG bytes.
 
-    Additionally, aggressively downscale large images so the final PNG
-    stays under target_max_bytes (default ~4 MB), even if the original
-    upload is huge (e.g. up to 100 MB).
+    Additionally, downscale to VISION_MAX_EDGE and then aggressively further
+    so the final PNG stays under target_max_bytes (default ~3.75 MB), even if
+    the original upload is huge (e.g. up to 100 MB).
+
+    PNGs that are already small enough are passed through by
+    encode_image_payload and never reach this function.
     """
+    from PIL import Image
+
     img = Image.open(BytesIO(raw_bytes))
 
     # Normalize mode
@@ -53,10 +146,15 @@ def to_png_bytes(raw_bytes: bytes, target_max_bytes: int = 4_000_000) -> bytes:
     else:
         img = img.convert("RGB")
 
-    def encode_png(i: Image.Image) -> bytes:
+    img = shrink_to_vision_max(img)
+
+    def encode_png(i: Image.Image) -> memoryview:
+        # getbuffer() exposes the PNG without copying it out of the BytesIO
         buf = BytesIO()
-        i.save(buf, format="PNG", optimize=True)
-        return buf.getvalue()
+        # compress_level=1 is much faster than optimize=True for a
+        # near-identical file size.
+        i.save(buf, format="PNG", optimize=False, compress_level=1)
+        return buf.getbuffer()
 
     # Initial encode
     png_bytes = encode_png(img)
@@ -89,22 +187,14 @@ def to_png_bytes(raw_bytes: bytes, target_max_bytes: int = 4_000_000) -> bytes:
 
 # ---------- Claude helper ----------
 
-def describe_image_with_claude(image_bytes: bytes, max_words: int) -> str:
-    """
-    Send an image + instructions to Claude and get back a markdown description
-    following your #Approach.
-    """
-
-    # Hard cap at 300 words regardless of slider
-    max_words = min(max_words, 300)
-
-    # Normalize image to PNG & downscale if needed
-    png_bytes = to_png_bytes(image_bytes)
-    b64_image = base64.b64encode(png_bytes).decode("utf-8")
-
-    client = get_claude_client()
+_SYSTEM_PROMPT = (
+    "You are an assistant that writes short, structured, accessible image "
+    "descriptions for people who cannot see the image. "
+    "Always start with a 'Picture Type' line and respect the word limit."
+)
 
-    user_prompt = f"""
+# Only max_words varies per request; filled in with str.format.
+_USER_PROMPT_TMPL = """
 You will see an image. Follow this approach strictly:
 
 #Approach
@@ -118,14 +208,58 @@ You will see an image. Follow this approach strictly:
 7. Output **only** the description itself (starting with the “Picture Type” line). Do not repeat these instructions or add extra commentary.
 """
 
-    response = client.messages.create(
+
+def encode_image_payload(image_bytes: bytes) -> tuple[str, str]:
+    """
+    Return (media_type, base64 data) for an upload.
+
+    Uploads that are already in a Claude-supported format and small enough
+    are sent unchanged; oversized JPEG/WebP/GIF uploads are downscaled as
+    JPEG/WebP and everything else is normalized to PNG & downscaled.
+    """
+    sniffed_type, fits = sniff_image(image_bytes)
+    if sniffed_type is not None and fits and len(image_bytes) <= MAX_IMAGE_BYTES:
+        media_type = sniffed_type
+        payload_bytes = image_bytes
+    elif sniffed_type in ("image/jpeg", "image/webp", "image/gif"):
+        # Oversized photo: shrink it but keep a lossy format
+        media_type, payload_bytes = to_compact_bytes(image_bytes)
+    else:
+        # Normalize image to PNG & downscale if needed
+        media_type = "image/png"
+        payload_bytes = to_png_bytes(image_bytes)
+    return media_type, base64.b64encode(payload_bytes).decode("ascii")
+
+
+def describe_image_with_claude(
+    image_bytes: bytes,
+    max_words: int,
+    on_text: Callable[[str], None] | None = None,
+) -> str:
+    """
+    Send an image + instructions to Claude and get back a markdown description
+    following your #Approach.
+
+    The response is streamed; if on_text is given it is called with the text
+    received so far after every delta.
+    """
+
+    # Hard cap at 300 words regardless of slider
+    max_words = min(max_words, 300)
+
+    # A re-encoded PNG/JPEG buffer is released when encode_image_payload
+    # returns; the raw upload bytes stay alive in the caller's UploadedFile.
+    media_type, b64_image = encode_image_payload(image_bytes)
+
+    client = get_claude_client()
+
+    user_prompt = _USER_PROMPT_TMPL.format(max_words=max_words)
+
+    text = ""
+    with client.messages.stream(
         model="claude-3-haiku-20240307",
         max_tokens=600,
-        system=(
-            "You are an assistant that writes short, structured, accessible image "
-            "descriptions for people who cannot see the image. "
-            "Always start with a 'Picture Type' line and respect the word limit."
-        ),
+        system=_SYSTEM_PROMPT,
         messages=[
             {
                 "role": "user",
@@ -134,7 +268,7 @@ You will see an image. Follow this approach strictly:
                         "type": "image",
                         "source": {
                             "type": "base64",
-                            "media_type": "image/png",  # we now always send PNG
+                            "media_type": media_type,
                             "data": b64_image,
                         },
                     },
@@ -142,20 +276,27 @@ You will see an image. Follow this approach strictly:
                 ],
             }
         ],
-    )
+    ) as stream:
+        for delta in stream.text_stream:
+            text += delta
+            if on_text is not None:
+                on_text(text)
+
+    return enforce_word_limit(text, max_words)
 
-    text_chunks = [
-        b.text for b in response.content if getattr(b, "type", None) == "text"
-    ]
-    description = "\n\n".join(text_chunks)
-    return enforce_word_limit(description, max_words)
+
+_WORD_RE = re.compile(r"\S+")
 
 
 def enforce_word_limit(text: str, max_words: int) -> str:
-    words = text.split()
-    if len(words) <= max_words:
-        return text
-    return " ".join(words[:max_words]) + "..."
+    # Scan words lazily and stop at the first one past the limit, slicing the
+    # original text instead of building and re-joining a list of words.
+    end = 0
+    for count, match in enumerate(_WORD_RE.finditer(text)):
+        if count == max_words:
+            return text[:end] + "..."
+        end = match.end()
+    return text
 
 
 # ---------- Streamlit UI ----------
@@ -167,32 +308,43 @@ if "description" not in st.session_state:
 
 # Load cat image for header
 CAT_PATH = "cool_cat.jpg"   # make sure this file is next to app.py
-with open(CAT_PATH, "rb") as f:
-    cat_b64 = base64.b64encode(f.read()).decode("utf-8")
+
+
+@st.cache_data
+def _load_cat_html(path: str) -> str:
+    # Read, encode and template once per process instead of on every rerun;
+    # keyed on the short path so cache hits don't hash the image itself.
+    with open(path, "rb") as f:
+        cat_b64 = base64.b64encode(f.read()).decode("ascii")
+    return f"""
+    <div class="hero-cat-wrap">
+        <img class="hero-cat-img" src="data:image/jpeg;base64,{cat_b64}" />
+    </div>
+    """
 
 # ---------- Styles ----------
 
-st.markdown(
-    f"""
+# Plain string literal (no f-string), so nothing is formatted on each rerun.
+_STYLES = """
     <style>
     /* Completely hide Streamlit header + pill */
-    header[data-testid="stHeader"] {{
+    header[data-testid="stHeader"] {
         display: none !important;
-    }}
-    div[data-testid="stDecoration"] {{
+    }
+    div[data-testid="stDecoration"] {
         display: none !important;
-    }}
+    }
 
-    .stApp {{
+    .stApp {
         background: radial-gradient(circle at top, #ffe9c7 0, #f5f7ff 45%, #f0f0f0 100%);
-    }}
+    }
 
-    .main .block-container {{
+    .main .block-container {
         padding-top: 0.5rem;
         padding-bottom: 2.5rem;
-    }}
+    }
 
-    .describer-card {{
+    .describer-card {
         max-width: 460px;
         margin: 0 auto 0 auto;
         padding: 0.75rem 1.5rem 1.5rem 1.5rem;
@@ -200,54 +352,47 @@ st.markdown(
         background: #ffffff;
         border: 1px solid rgba(0,0,0,0.1);
         box-shadow: 0 16px 40px rgba(0,0,0,0.18);
-    }}
+    }
 
-    .describer-title {{
+    .describer-title {
         text-align: center;
         font-size: 1.9rem;
         font-weight: 800;
         margin-top: 0.4rem;
         margin-bottom: 0.3rem;
-    }}
+    }
 
-    .describer-subtitle {{
+    .describer-subtitle {
         text-align: center;
         font-size: 0.9rem;
         color: #555;
         margin-bottom: 1rem;
-    }}
+    }
 
     /* Center cat image */
-    .hero-cat-wrap {{
+    .hero-cat-wrap {
         display: flex;
         justify-content: center;
         margin-top: 0.3rem;
         margin-bottom: 0.4rem;
-    }}
+    }
 
-    .hero-cat-img {{
+    .hero-cat-img {
         border-radius: 20px;
         box-shadow: 0 12px 32px rgba(0,0,0,0.35);
         width: 260px;
         height: auto;
-    }}
+    }
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+
+st.markdown(_STYLES, unsafe_allow_html=True)
 
 st.markdown('<div class="describer-card">', unsafe_allow_html=True)
 
 # ---------- Center Cat ----------
 
-st.markdown(
-    f"""
-    <div class="hero-cat-wrap">
-        <img class="hero-cat-img" src="data:image/jpeg;base64,{cat_b64}" />
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
+st.markdown(_load_cat_html(CAT_PATH), unsafe_allow_html=True)
 
 # ---------- Title ----------
 
@@ -275,21 +420,26 @@ if uploaded_file is not None:
     else:
         st.image(uploaded_file)
 
-# ---------- Slider ----------
-
-max_words = st.slider(
-    "Description Length (words)",
-    min_value=1,
-    max_value=300,     # max 300 now
-    value=100,         # default 100
-    help="Claude will try to stay under this word limit (absolute maximum 300).",
-)
+# ---------- Slider + actions ----------
+
+# Inside a form, moving the slider doesn't rerun the script; only the
+# Describe / Clear submit buttons do.
+with st.form("describer", clear_on_submit=False, border=False):
+    max_words = st.slider(
+        "Description Length (words)",
+        min_value=1,
+        max_value=300,     # max 300 now
+        value=100,         # default 100
+        help="Claude will try to stay under this word limit (absolute maximum 300).",
+    )
 
-col1, col2 = st.columns([1, 1])
-with col1:
-    describe_clicked = st.button("Describe", use_container_width=True, type="primary")
-with col2:
-    clear_clicked = st.button("Clear", use_container_width=True)
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        describe_clicked = st.form_submit_button(
+            "Describe", use_container_width=True, type="primary"
+        )
+    with col2:
+        clear_clicked = st.form_submit_button("Clear", use_container_width=True)
 
 if clear_clicked:
     st.session_state.description = ""
@@ -299,41 +449,26 @@ if describe_clicked:
         st.warning("Please upload an image first (max 100 MB).")
     else:
         with st.spinner("Asking Claude to describe your image..."):
+            # Live preview of the streamed text; cleared once the final
+            # description is rendered below.
+            preview = st.empty()
             try:
                 st.session_state.description = describe_image_with_claude(
                     uploaded_file.getvalue(),
                     max_words,
+                    on_text=preview.markdown,
                 ).strip()
             except Exception as e:
                 st.error(f"Something went wrong talking to Claude: {e}")
+            preview.empty()
 
 st.markdown("### Description")
 
 if st.session_state.description:
     st.markdown(st.session_state.description)
+    # st.code renders a native copy-to-clipboard button, no rerun needed
+    st.code(st.session_state.description, language="markdown")
 else:
     st.write("_No description yet. Upload an image and click **Describe**._")
 
-# ---------- Copy Controls ----------
-
-col_copy, col_clear2 = st.columns([1, 1])
-with col_copy:
-    copy_clicked = st.button("Copy", use_container_width=True)
-with col_clear2:
-    clear2_clicked = st.button("Clear text", use_container_width=True)
-
-if clear2_clicked:
-    st.session_state.description = ""
-
-if copy_clicked and st.session_state.description:
-    st_html(
-        f"""
-        <script>
-        navigator.clipboard.writeText({json.dumps(st.session_state.description)});
-        </script>
-        """,
-        height=0,
-    )
-    st.success("Description copied to clipboard!")
-
 st.markdown("</div>", unsafe_allow_html=True)